@@ -1,37 +1,192 @@
 import aiosqlite
+import asyncio
 import os
+from contextlib import asynccontextmanager
+from pathlib import Path
 
 DB_PATH = os.getenv('DB_PATH', 'anime.db')
+READER_COUNT = 4
+# Set explicitly for tuning. sqlite3's default of 128 already holds the dozen or
+# so fixed statements in main.py, so this makes no measurable difference today.
+STATEMENT_CACHE_SIZE = 256
 
+# Applied to every connection the pool opens. journal_mode is persisted in
+# the database file, so only the writer sets it.
+CONNECTION_PRAGMAS = (
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA cache_size=-64000",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA foreign_keys=ON",
+    "PRAGMA busy_timeout=5000",
+)
 
-async def init_db():
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS anime (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                title TEXT NOT NULL UNIQUE,
-                description TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+
+def dict_factory(cursor, row):
+    # Build the response-ready dict directly in the worker thread instead of
+    # an aiosqlite.Row that handlers then copy into a dict.
+    return dict(zip([column[0] for column in cursor.description], row))
+
+
+async def configure_connection(db):
+    db.row_factory = dict_factory
+    for pragma in CONNECTION_PRAGMAS:
+        await db.execute(pragma)
+
+
+class DBPool:
+    """One read-write connection plus a fixed set of read-only connections.
+
+    WAL lets the readers run alongside the writer, while all writes are
+    funnelled through the single writer connection under a lock.
+    """
+
+    def __init__(self, size=READER_COUNT):
+        self.size = size
+        self.writer: aiosqlite.Connection | None = None
+        self.readers: asyncio.Queue[aiosqlite.Connection] | None = None
+        self._write_lock: asyncio.Lock | None = None
+
+    async def open(self):
+        self._write_lock = asyncio.Lock()
+        # isolation_level=None stops sqlite3 from opening implicit
+        # transactions; multi-statement writes use transaction() instead.
+        self.writer = await aiosqlite.connect(DB_PATH, isolation_level=None, cached_statements=STATEMENT_CACHE_SIZE)
+        await self.writer.execute("PRAGMA journal_mode=WAL")
+        await configure_connection(self.writer)
+
+    def reader_uri(self):
+        # as_uri() percent-encodes characters such as '?', '#' and '%'.
+        return Path(DB_PATH).resolve().as_uri() + "?mode=ro"
+
+    async def open_readers(self):
+        self.readers = asyncio.Queue(maxsize=self.size)
+        for _ in range(self.size):
+            reader = await aiosqlite.connect(
+                self.reader_uri(), uri=True, isolation_level=None, cached_statements=STATEMENT_CACHE_SIZE
             )
-        """)
+            await configure_connection(reader)
+            self.readers.put_nowait(reader)
+
+    async def close(self):
+        if self.readers is not None:
+            while not self.readers.empty():
+                await self.readers.get_nowait().close()
+            self.readers = None
+        if self.writer is not None:
+            await self.writer.close()
+            self.writer = None
+
+    @asynccontextmanager
+    async def read(self):
+        reader = await self.readers.get()
+        try:
+            yield reader
+        finally:
+            self.readers.put_nowait(reader)
+
+    @asynccontextmanager
+    async def write(self):
+        async with self._write_lock:
+            try:
+                yield self.writer
+            except BaseException:
+                if self.writer.in_transaction:
+                    await self.writer.rollback()
+                raise
+
+
+async def db_dep():
+    async with pool.read() as db:
+        yield db
 
+
+async def db_write_dep():
+    async with pool.write() as db:
+        yield db
+
+
+async def fetch_one(db, sql, parameters=()):
+    # execute_fetchall() runs the statement and reads its rows in a single
+    # trip to the connection's worker thread; a cursor needs three.
+    rows = await db.execute_fetchall(sql, parameters)
+    return rows[0] if rows else None
+
+
+@asynccontextmanager
+async def transaction(db):
+    # IMMEDIATE takes the write lock up front, so statements inside the
+    # block share one commit instead of autocommitting one by one.
+    await db.execute("BEGIN IMMEDIATE")
+    try:
+        yield db
+    except BaseException:
+        await db.rollback()
+        raise
+    await db.commit()
+
+
+pool = DBPool()
+
+
+async def init_db():
+    await pool.close()
+    await pool.open()
+    db = pool.writer
+
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS anime (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT NOT NULL UNIQUE,
+            description TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            normalized_title TEXT GENERATED ALWAYS AS (lower(trim(title))) VIRTUAL
+        )
+    """)
+
+    # Databases created before normalized_title existed get it added here;
+    # generated columns only show up in table_xinfo, not table_info.
+    anime_columns = {row['name'] for row in await db.execute_fetchall("PRAGMA table_xinfo(anime)")}
+    if 'normalized_title' not in anime_columns:
         await db.execute("""
-            CREATE TABLE IF NOT EXISTS reviews (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                anime_id INTEGER NOT NULL,
-                user_name TEXT NOT NULL,
-                rating REAL NOT NULL CHECK(rating >= 0 AND rating <= 10),
-                review_text TEXT,
-                status TEXT NOT NULL CHECK(status IN ('watched', 'planning')),
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (anime_id) REFERENCES anime(id) ON DELETE CASCADE
-            )
+            ALTER TABLE anime ADD COLUMN
+            normalized_title TEXT GENERATED ALWAYS AS (lower(trim(title))) VIRTUAL
         """)
 
-        await db.commit()
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS reviews (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            anime_id INTEGER NOT NULL,
+            user_name TEXT NOT NULL,
+            rating REAL NOT NULL CHECK(rating >= 0 AND rating <= 10),
+            review_text TEXT,
+            status TEXT NOT NULL CHECK(status IN ('watched', 'planning')),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (anime_id) REFERENCES anime(id) ON DELETE CASCADE
+        )
+    """)
+
+    await db.execute("""
+        CREATE INDEX IF NOT EXISTS idx_reviews_anime_created
+        ON reviews(anime_id, created_at DESC)
+    """)
+
+    await db.execute("""
+        CREATE INDEX IF NOT EXISTS idx_reviews_watched_anime
+        ON reviews(anime_id) WHERE status = 'watched'
+    """)
+
+    await db.execute("""
+        CREATE INDEX IF NOT EXISTS idx_anime_normalized_title
+        ON anime(normalized_title)
+    """)
+
+    # Refresh planner statistics so the indexes above get picked up.
+    await db.execute("ANALYZE")
+
+    # Read-only connections can only be opened once the file and schema exist.
+    await pool.open_readers()
 
 
-async def get_db():
-    db = await aiosqlite.connect(DB_PATH)
-    db.row_factory = aiosqlite.Row
-    return db
\ No newline at end of file
+async def close_db():
+    await pool.close()
@@ -1,10 +1,13 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import Depends, FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
-from pydantic import BaseModel, validator
-from typing import Optional, List
-from backend.database import init_db, get_db
+from fastapi.responses import FileResponse, ORJSONResponse, Response
+from pydantic import BaseModel, Field, TypeAdapter, model_validator
+from typing import Annotated, Literal, Optional, List
+from datetime import datetime
+import aiosqlite
+import asyncio
+from backend.database import init_db, close_db, db_dep, db_write_dep, fetch_one, pool, transaction
 import os
 
 
@@ -20,45 +23,27 @@ class AnimeResponse(BaseModel):
     total_reviews: int
     latest_review_text: Optional[str]
     latest_review_user: Optional[str]
-    created_at: str
+    created_at: datetime
 
 
 class ReviewCreate(BaseModel):
     anime_id: int
     user_name: str
-    rating: float
+    rating: float = Field(ge=0, le=10)
     review_text: Optional[str] = None
-    status: str
+    status: Literal['watched', 'planning']
 
-    @validator('rating')
-    def validate_rating(cls, v):
-        if v < 0 or v > 10:
-            raise ValueError('Rating must be between 0 and 10')
-        return v
-
-    @validator('status')
-    def validate_status(cls, v):
-        if v not in ['watched', 'planning']:
-            raise ValueError('Status must be watched or planning')
-        return v
-
-    @validator('rating')
-    def validate_rating_with_status(cls, v, values):
-        if values.get('status') == 'planning' and v > 0:
+    @model_validator(mode='after')
+    def validate_rating_with_status(self):
+        if self.status == 'planning' and self.rating > 0:
             raise ValueError('Cannot rate anime with planning status')
-        return v
+        return self
 
 
 class ReviewUpdate(BaseModel):
-    rating: Optional[float] = None
+    rating: Optional[float] = Field(default=None, ge=0, le=10)
     review_text: Optional[str] = None
-    status: Optional[str] = None
-
-    @validator('rating')
-    def validate_rating(cls, v):
-        if v is not None and (v < 0 or v > 10):
-            raise ValueError('Rating must be between 0 and 10')
-        return v
+    status: Optional[Literal['watched', 'planning']] = None
 
 
 class ReviewResponse(BaseModel):
@@ -68,7 +53,7 @@ class ReviewResponse(BaseModel):
     rating: float
     review_text: Optional[str]
     status: str
-    created_at: str
+    created_at: datetime
 
 
 class AnimeWithReviews(BaseModel):
@@ -76,7 +61,137 @@ class AnimeWithReviews(BaseModel):
     reviews: List[ReviewResponse]
 
 
-app = FastAPI(title="Anime Review Site")
+anime_list_adapter = TypeAdapter(List[AnimeResponse])
+
+# scope="function" returns the lease (and releases the write lock) as soon
+# as the handler returns, instead of after the response has been sent.
+ReadDB = Annotated[aiosqlite.Connection, Depends(db_dep, scope="function")]
+WriteDB = Annotated[aiosqlite.Connection, Depends(db_write_dep, scope="function")]
+
+
+# Every statement the handlers run. The texts are fixed, so each one is
+# parsed once per connection and then served from sqlite3's statement cache.
+SQL_LIST_ANIME = """
+    WITH latest AS (
+        SELECT
+            anime_id,
+            user_name,
+            review_text,
+            ROW_NUMBER() OVER (PARTITION BY anime_id ORDER BY created_at DESC, id DESC) as rn
+        FROM reviews
+    )
+    SELECT 
+        a.id,
+        a.title,
+        a.description,
+        AVG(CASE WHEN r.status = 'watched' THEN r.rating ELSE NULL END) as average_rating,
+        COUNT(r.id) as total_reviews,
+        l.review_text as latest_review_text,
+        l.user_name as latest_review_user,
+        a.created_at
+    FROM anime a
+    LEFT JOIN reviews r ON a.id = r.anime_id
+    LEFT JOIN latest l ON a.id = l.anime_id AND l.rn = 1
+    GROUP BY a.id
+    ORDER BY a.created_at DESC
+"""
+
+SQL_GET_ANIME = """
+    WITH latest AS (
+        SELECT
+            anime_id,
+            user_name,
+            review_text,
+            ROW_NUMBER() OVER (PARTITION BY anime_id ORDER BY created_at DESC, id DESC) as rn
+        FROM reviews
+        WHERE anime_id = ?
+    )
+    SELECT 
+        a.id,
+        a.title,
+        a.description,
+        AVG(CASE WHEN r.status = 'watched' THEN r.rating ELSE NULL END) as average_rating,
+        COUNT(r.id) as total_reviews,
+        l.review_text as latest_review_text,
+        l.user_name as latest_review_user,
+        strftime('%Y-%m-%dT%H:%M:%S', a.created_at) as created_at
+    FROM anime a
+    LEFT JOIN reviews r ON a.id = r.anime_id
+    LEFT JOIN latest l ON a.id = l.anime_id AND l.rn = 1
+    WHERE a.id = ?
+    GROUP BY a.id
+"""
+
+SQL_GET_REVIEWS = """
+    SELECT id, anime_id, user_name, rating, review_text, status, strftime('%Y-%m-%dT%H:%M:%S', created_at) as created_at
+    FROM reviews
+    WHERE anime_id = ?
+    ORDER BY reviews.created_at DESC
+"""
+
+SQL_INSERT_ANIME = """
+    INSERT INTO anime (title, description) VALUES (?, ?)
+    RETURNING id, title, description, NULL as average_rating, 0 as total_reviews, NULL as latest_review_text, NULL as latest_review_user, created_at
+"""
+
+SQL_DELETE_ANIME = "DELETE FROM anime WHERE id=?"
+
+SQL_INSERT_REVIEW = """
+    INSERT INTO reviews (anime_id, user_name, rating, review_text, status) VALUES (?, ?, ?, ?, ?)
+    RETURNING id, anime_id, user_name, rating, review_text, status, created_at
+"""
+
+SQL_MAX_REVIEW_ID = "SELECT COALESCE(MAX(id), 0) as last_id FROM reviews"
+
+SQL_BULK_INSERT_REVIEW = "INSERT INTO reviews (anime_id, user_name, rating, review_text, status) VALUES (?, ?, ?, ?, ?)"
+
+SQL_REVIEWS_AFTER_ID = """
+    SELECT id, anime_id, user_name, rating, review_text, status, created_at
+    FROM reviews WHERE id > ? ORDER BY id
+"""
+
+SQL_GET_REVIEW = """
+    SELECT id, anime_id, user_name, rating, review_text, status, created_at
+    FROM reviews WHERE id = ?
+"""
+
+SQL_UPDATE_REVIEW = """
+    UPDATE reviews SET
+        rating = COALESCE(?, rating),
+        review_text = COALESCE(?, review_text),
+        status = COALESCE(?, status)
+    WHERE id = ?
+    RETURNING id, anime_id, user_name, rating, review_text, status, created_at
+"""
+
+SQL_DELETE_REVIEW = "DELETE FROM reviews WHERE id=?"
+
+SQL_STATS = """
+    SELECT 
+        a.title as title,
+        AVG(r.rating) as average_rating,
+        COUNT(r.id) as review_count
+    FROM anime a
+    INNER JOIN reviews r ON a.id = r.anime_id
+    WHERE r.status = 'watched'
+    GROUP BY a.normalized_title
+    HAVING COUNT(r.id) > 0
+    ORDER BY average_rating DESC
+"""
+
+
+# /api/stats is served from memory until a review write bumps the generation.
+_stats_cache: list[dict] | None = None
+_stats_cache_generation = -1
+_stats_generation = 0
+
+
+def invalidate_stats():
+    global _stats_generation
+    _stats_generation += 1
+
+
+app = FastAPI(title="Anime Review Site", default_response_class=ORJSONResponse)
 
 app.add_middleware(
     CORSMiddleware,
@@ -91,216 +206,162 @@ async def startup():
     await init_db()
 
 
+@app.on_event("shutdown")
+async def shutdown():
+    await close_db()
+
+
 @app.get("/api/anime", response_model=List[AnimeResponse])
-async def get_all_anime():
-    db = await get_db()
-    async with db.execute("""
-        SELECT 
-            a.id,
-            a.title,
-            a. description,
-            AVG(CASE WHEN r.status = 'watched' THEN r.rating ELSE NULL END) as average_rating,
-            COUNT(r.id) as total_reviews,
-            (SELECT review_text FROM reviews WHERE anime_id = a.id ORDER BY created_at DESC LIMIT 1) as latest_review_text,
-            (SELECT user_name FROM reviews WHERE anime_id = a.id ORDER BY created_at DESC LIMIT 1) as latest_review_user,
-            a.created_at
-        FROM anime a
-        LEFT JOIN reviews r ON a.id = r.anime_id
-        GROUP BY a.id
-        ORDER BY a.created_at DESC
-    """) as cursor:
-        rows = await cursor.fetchall()
-    await db.close()
-    return [dict(row) for row in rows]
+async def get_all_anime(db: ReadDB):
+    rows = await db.execute_fetchall(SQL_LIST_ANIME)
+    # One pydantic-core call validates the whole list and encodes it to JSON;
+    # returning a Response skips FastAPI's own per-item pass, while
+    # response_model still documents it.
+    return Response(
+        anime_list_adapter.dump_json(anime_list_adapter.validate_python(rows)),
+        media_type="application/json"
+    )
+
+
+async def fetch_anime_row(anime_id):
+    async with pool.read() as db:
+        return await fetch_one(db, SQL_GET_ANIME, (anime_id, anime_id))
+
+
+async def fetch_reviews(anime_id):
+    async with pool.read() as db:
+        return await db.execute_fetchall(SQL_GET_REVIEWS, (anime_id,))
 
 
 @app.get("/api/anime/{anime_id}", response_model=AnimeWithReviews)
 async def get_anime(anime_id: int):
-    db = await get_db()
-
-    async with db.execute("""
-        SELECT 
-            a. id,
-            a.title,
-            a.description,
-            AVG(CASE WHEN r.status = 'watched' THEN r.rating ELSE NULL END) as average_rating,
-            COUNT(r.id) as total_reviews,
-            (SELECT review_text FROM reviews WHERE anime_id = a.id ORDER BY created_at DESC LIMIT 1) as latest_review_text,
-            (SELECT user_name FROM reviews WHERE anime_id = a.id ORDER BY created_at DESC LIMIT 1) as latest_review_user,
-            a.created_at
-        FROM anime a
-        LEFT JOIN reviews r ON a.id = r.anime_id
-        WHERE a.id = ?
-        GROUP BY a.id
-    """, (anime_id,)) as cursor:
-        anime_row = await cursor.fetchone()
+    # The two queries are independent, so each leases its own reader and
+    # they run on separate aiosqlite threads.
+    async with asyncio.TaskGroup() as tg:
+        anime_task = tg.create_task(fetch_anime_row(anime_id))
+        reviews_task = tg.create_task(fetch_reviews(anime_id))
 
+    anime_row = anime_task.result()
     if not anime_row:
-        await db.close()
         raise HTTPException(404, "Anime not found")
+    review_rows = reviews_task.result()
 
-    async with db.execute("""
-        SELECT id, anime_id, user_name, rating, review_text, status, created_at
-        FROM reviews
-        WHERE anime_id = ?
-        ORDER BY created_at DESC
-    """, (anime_id,)) as cursor:
-        review_rows = await cursor.fetchall()
-
-    await db.close()
-
-    return {
-        "anime": dict(anime_row),
-        "reviews": [dict(row) for row in review_rows]
-    }
+    return ORJSONResponse({
+        "anime": anime_row,
+        "reviews": review_rows
+    })
 
 
 @app.post("/api/anime", response_model=AnimeResponse)
-async def create_anime(anime: AnimeCreate):
-    db = await get_db()
-
+async def create_anime(anime: AnimeCreate, db: WriteDB):
     try:
-        cursor = await db.execute(
-            "INSERT INTO anime (title, description) VALUES (?, ?)",
-            (anime.title, None)
-        )
-        await db.commit()
-        anime_id = cursor.lastrowid
-    except Exception as e:
-        await db.close()
+        row = await fetch_one(db, SQL_INSERT_ANIME, (anime.title, None))
+    except aiosqlite.IntegrityError:
         raise HTTPException(400, "Anime with this title already exists")
 
-    async with db.execute("""
-        SELECT id, title, description, NULL as average_rating, 0 as total_reviews, NULL as latest_review_text, NULL as latest_review_user, created_at
-        FROM anime WHERE id = ?
-    """, (anime_id,)) as cursor:
-        row = await cursor.fetchone()
-
-    await db.close()
-    return dict(row)
+    return row
 
 
 @app.delete("/api/anime/{anime_id}")
-async def delete_anime(anime_id: int):
-    db = await get_db()
-    await db.execute("DELETE FROM anime WHERE id=?", (anime_id,))
-    await db.commit()
-    await db.close()
+async def delete_anime(anime_id: int, db: WriteDB):
+    await db.execute(SQL_DELETE_ANIME, (anime_id,))
+    invalidate_stats()
     return {"ok": True}
 
 
-@app.post("/api/reviews", response_model=ReviewResponse)
-async def create_review(review: ReviewCreate):
-    db = await get_db()
-
-    async with db.execute("SELECT id FROM anime WHERE id = ?", (review.anime_id,)) as cursor:
-        anime_exists = await cursor.fetchone()
-
-    if not anime_exists:
-        await db.close()
-        raise HTTPException(404, "Anime not found")
-
-    if review.status == 'planning' and review.rating > 0:
-        await db.close()
-        raise HTTPException(400, "Cannot rate anime with planning status")
+def review_integrity_error(e):
+    # foreign_keys=ON makes the insert itself reject unknown anime ids.
+    if e.sqlite_errorname == "SQLITE_CONSTRAINT_FOREIGNKEY":
+        return HTTPException(404, "Anime not found")
+    return HTTPException(400, "Invalid review")
 
-    cursor = await db.execute(
-        "INSERT INTO reviews (anime_id, user_name, rating, review_text, status) VALUES (?, ?, ?, ?, ?)",
-        (review.anime_id, review.user_name, review.rating, review.review_text, review.status)
-    )
-    await db.commit()
 
-    review_id = cursor.lastrowid
-    async with db.execute("SELECT * FROM reviews WHERE id = ?", (review_id,)) as cursor:
-        row = await cursor.fetchone()
+@app.post("/api/reviews", response_model=ReviewResponse)
+async def create_review(review: ReviewCreate, db: WriteDB):
+    try:
+        row = await fetch_one(
+            db, SQL_INSERT_REVIEW,
+            (review.anime_id, review.user_name, review.rating, review.review_text, review.status)
+        )
+    except aiosqlite.IntegrityError as e:
+        raise review_integrity_error(e)
 
-    await db.close()
-    return dict(row)
+    invalidate_stats()
+    return row
 
 
-@app.patch("/api/reviews/{review_id}", response_model=ReviewResponse)
-async def update_review(review_id: int, review_update: ReviewUpdate):
-    db = await get_db()
+@app.post("/api/reviews/bulk", response_model=List[ReviewResponse])
+async def create_reviews_bulk(reviews: List[ReviewCreate], db: WriteDB):
+    if not reviews:
+        return []
 
-    async with db.execute("SELECT * FROM reviews WHERE id = ?", (review_id,)) as cursor:
-        current_review = await cursor.fetchone()
+    async with transaction(db):
+        # Ids are AUTOINCREMENT and this is the only writer, so the new
+        # rows are exactly those above the current maximum.
+        last_id = (await fetch_one(db, SQL_MAX_REVIEW_ID))['last_id']
 
-    if not current_review:
-        await db.close()
-        raise HTTPException(404, "Review not found")
+        try:
+            await db.executemany(
+                SQL_BULK_INSERT_REVIEW,
+                [(review.anime_id, review.user_name, review.rating, review.review_text, review.status) for review in reviews]
+            )
+        except aiosqlite.IntegrityError as e:
+            raise review_integrity_error(e)
 
-    current_status = review_update.status if review_update.status else current_review['status']
-    new_rating = review_update.rating if review_update.rating is not None else current_review['rating']
+        rows = await db.execute_fetchall(SQL_REVIEWS_AFTER_ID, (last_id,))
 
-    if current_status == 'planning' and new_rating > 0:
-        await db.close()
-        raise HTTPException(400, "Cannot rate anime with planning status")
+    invalidate_stats()
+    return rows
 
-    update_parts = []
-    update_values = []
 
-    if review_update.rating is not None:
-        update_parts.append("rating = ?")
-        update_values.append(review_update.rating)
+@app.patch("/api/reviews/{review_id}", response_model=ReviewResponse)
+async def update_review(review_id: int, review_update: ReviewUpdate, db: WriteDB):
+    async with transaction(db):
+        current_review = await fetch_one(db, SQL_GET_REVIEW, (review_id,))
 
-    if review_update.review_text is not None:
-        update_parts.append("review_text = ?")
-        update_values.append(review_update.review_text)
+        if not current_review:
+            raise HTTPException(404, "Review not found")
 
-    if review_update.status:
-        update_parts.append("status = ?")
-        update_values.append(review_update.status)
+        current_status = review_update.status if review_update.status else current_review['status']
+        new_rating = review_update.rating if review_update.rating is not None else current_review['rating']
 
-    if update_parts:
-        update_values.append(review_id)
-        query = f"UPDATE reviews SET {', '.join(update_parts)} WHERE id = ?"
-        await db.execute(query, tuple(update_values))
-        await db.commit()
+        if current_status == 'planning' and new_rating > 0:
+            raise HTTPException(400, "Cannot rate anime with planning status")
 
-    async with db.execute("SELECT * FROM reviews WHERE id = ?", (review_id,)) as cursor:
-        row = await cursor.fetchone()
+        # COALESCE leaves fields that were not sent unchanged.
+        row = await fetch_one(
+            db, SQL_UPDATE_REVIEW,
+            (review_update.rating, review_update.review_text, review_update.status, review_id)
+        )
 
-    await db.close()
-    return dict(row)
+    invalidate_stats()
+    return row
 
 
 @app.delete("/api/reviews/{review_id}")
-async def delete_review(review_id: int):
-    db = await get_db()
-    await db.execute("DELETE FROM reviews WHERE id=?", (review_id,))
-    await db.commit()
-    await db.close()
+async def delete_review(review_id: int, db: WriteDB):
+    await db.execute(SQL_DELETE_REVIEW, (review_id,))
+    invalidate_stats()
     return {"ok": True}
 
 
 @app.get("/api/stats")
 async def get_stats():
-    db = await get_db()
-    async with db.execute("""
-        SELECT 
-            LOWER(TRIM(a.title)) as normalized_title,
-            a.title as display_title,
-            AVG(r.rating) as average_rating,
-            COUNT(r.id) as review_count
-        FROM anime a
-        INNER JOIN reviews r ON a.id = r.anime_id
-        WHERE r.status = 'watched'
-        GROUP BY normalized_title
-        HAVING COUNT(r.id) > 0
-        ORDER BY average_rating DESC
-    """) as cursor:
-        rows = await cursor.fetchall()
-    await db.close()
-
-    result = []
-    for row in rows:
-        result.append({
-            "title": row['display_title'],
-            "average_rating": row['average_rating'],
-            "review_count": row['review_count']
-        })
-
-    return result
+    # No ReadDB dependency here: a cache hit must not wait for a reader.
+    global _stats_cache, _stats_cache_generation
+    if _stats_cache is not None and _stats_cache_generation == _stats_generation:
+        return _stats_cache
+
+    # Only cache the result if no write landed while the query ran; an older
+    # refresh that finishes late can then never overwrite a newer one.
+    generation = _stats_generation
+    async with pool.read() as db:
+        rows = await db.execute_fetchall(SQL_STATS)
+
+    if generation == _stats_generation:
+        _stats_cache = rows
+        _stats_cache_generation = generation
+    return rows
 
 
 @app.get("/")
@@ -1,25 +1,36 @@
 import pytest
+import pytest_asyncio
 import os
-from httpx import AsyncClient
-from main import app
-from database import init_db
+import asyncio
+import aiosqlite
+from contextlib import asynccontextmanager
+from httpx import ASGITransport, AsyncClient
 
-os.environ['DB_PATH'] = 'test_anime. db'
+os.environ['DB_PATH'] = 'test_anime.db'
 
+from backend.main import SQL_GET_REVIEWS, app, get_stats, invalidate_stats
+from backend.database import DBPool, init_db, close_db, pool, transaction
 
-@pytest.fixture(autouse=True)
+
+def remove_test_db():
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists('test_anime.db' + suffix):
+            os.remove('test_anime.db' + suffix)
+
+
+@pytest_asyncio.fixture(autouse=True)
 async def setup_db():
-    if os.path.exists('test_anime.db'):
-        os.remove('test_anime.db')
+    remove_test_db()
     await init_db()
+    invalidate_stats()
     yield
-    if os.path.exists('test_anime.db'):
-        os.remove('test_anime.db')
+    await close_db()
+    remove_test_db()
 
 
 @pytest.mark.asyncio
 async def test_create_anime():
-    async with AsyncClient(app=app, base_url="http://test") as client:
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
         response = await client.post("/api/anime", json={
             "title": "Naruto",
             "description": "Ninja story"
@@ -31,7 +42,7 @@ async def test_create_anime():
 
 @pytest.mark.asyncio
 async def test_create_review():
-    async with AsyncClient(app=app, base_url="http://test") as client:
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
         anime_response = await client.post("/api/anime", json={
             "title": "One Piece",
             "description": "Pirate adventure"
@@ -51,7 +62,7 @@ async def test_create_review():
 
 @pytest.mark.asyncio
 async def test_cannot_rate_planning():
-    async with AsyncClient(app=app, base_url="http://test") as client:
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
         anime_response = await client.post("/api/anime", json={
             "title": "Attack on Titan"
         })
@@ -63,4 +74,230 @@ async def test_cannot_rate_planning():
             "rating": 8.0,
             "status": "planning"
         })
-        assert review_response.status_code == 400
\ No newline at end of file
+        assert review_response.status_code == 422
+
+@pytest.mark.asyncio
+async def test_list_shows_latest_review():
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        anime_response = await client.post("/api/anime", json={
+            "title": "Bleach"
+        })
+        anime_id = anime_response.json()["id"]
+
+        for user_name, review_text in [("John", "Good start"), ("Jane", "Great ending")]:
+            await client.post("/api/reviews", json={
+                "anime_id": anime_id,
+                "user_name": user_name,
+                "rating": 8.0,
+                "review_text": review_text,
+                "status": "watched"
+            })
+
+        response = await client.get("/api/anime")
+        assert response.status_code == 200
+        data = response.json()[0]
+
+        detail = (await client.get(f"/api/anime/{anime_id}")).json()
+        assert detail["anime"]["created_at"] == data["created_at"]
+        assert "T" in detail["reviews"][0]["created_at"]
+        assert data["total_reviews"] == 2
+        assert data["latest_review_user"] == "Jane"
+        assert data["latest_review_text"] == "Great ending"
+
+
+@pytest.mark.asyncio
+async def test_duplicate_anime_title():
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        await client.post("/api/anime", json={"title": "Naruto"})
+        response = await client.post("/api/anime", json={"title": "Naruto"})
+        assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_review_for_unknown_anime():
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        response = await client.post("/api/reviews", json={
+            "anime_id": 999,
+            "user_name": "John",
+            "rating": 7.0,
+            "status": "watched"
+        })
+        assert response.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_reader_returned_after_error():
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        response = await client.get("/api/anime/999")
+        assert response.status_code == 404
+    assert pool.readers.qsize() == pool.size
+
+
+@pytest.mark.asyncio
+async def test_reader_is_read_only():
+    async with pool.read() as db:
+        with pytest.raises(aiosqlite.OperationalError, match="readonly database"):
+            await db.execute("INSERT INTO anime (title) VALUES ('Naruto')")
+
+
+@pytest.mark.asyncio
+async def test_write_rolls_back_on_error():
+    with pytest.raises(RuntimeError):
+        async with pool.write() as db, transaction(db):
+            await db.execute("INSERT INTO anime (title) VALUES ('Naruto')")
+            raise RuntimeError
+
+    async with pool.read() as db:
+        async with db.execute("SELECT COUNT(*) as count FROM anime") as cursor:
+            assert (await cursor.fetchone())["count"] == 0
+
+
+@pytest.mark.asyncio
+async def test_review_indexes():
+    async with pool.read() as db:
+        async with db.execute("SELECT name FROM sqlite_master WHERE type = 'index'") as cursor:
+            indexes = {row["name"] for row in await cursor.fetchall()}
+        assert "idx_reviews_anime_created" in indexes
+        assert "idx_reviews_watched_anime" in indexes
+        assert "idx_anime_normalized_title" in indexes
+
+        async with db.execute("EXPLAIN QUERY PLAN " + SQL_GET_REVIEWS, (1,)) as cursor:
+            plan = " ".join(row["detail"] for row in await cursor.fetchall())
+        assert "idx_reviews_anime_created" in plan
+        assert "TEMP B-TREE" not in plan
+
+
+@pytest.mark.asyncio
+async def test_stats_refresh_after_review():
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        anime_response = await client.post("/api/anime", json={
+            "title": "Naruto"
+        })
+        anime_id = anime_response.json()["id"]
+
+        for rating, expected_average in [(6.0, 6.0), (10.0, 8.0)]:
+            await client.post("/api/reviews", json={
+                "anime_id": anime_id,
+                "user_name": "John",
+                "rating": rating,
+                "status": "watched"
+            })
+            response = await client.get("/api/stats")
+            assert response.json()[0]["average_rating"] == expected_average
+
+
+@pytest.mark.asyncio
+async def test_create_reviews_bulk():
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        anime_response = await client.post("/api/anime", json={
+            "title": "Naruto"
+        })
+        anime_id = anime_response.json()["id"]
+
+        response = await client.post("/api/reviews/bulk", json=[
+            {"anime_id": anime_id, "user_name": "John", "rating": 9.0, "status": "watched"},
+            {"anime_id": anime_id, "user_name": "Jane", "rating": 0, "status": "planning"}
+        ])
+        assert response.status_code == 200
+        assert [review["user_name"] for review in response.json()] == ["John", "Jane"]
+
+        response = await client.post("/api/reviews/bulk", json=[
+            {"anime_id": anime_id, "user_name": "Jim", "rating": 7.0, "status": "watched"},
+            {"anime_id": 999, "user_name": "Joe", "rating": 7.0, "status": "watched"}
+        ])
+        assert response.status_code == 404
+
+        response = await client.get(f"/api/anime/{anime_id}")
+        assert len(response.json()["reviews"]) == 2
+
+
+@pytest.mark.asyncio
+async def test_update_review_keeps_unset_fields():
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        anime_response = await client.post("/api/anime", json={
+            "title": "Naruto"
+        })
+        review_response = await client.post("/api/reviews", json={
+            "anime_id": anime_response.json()["id"],
+            "user_name": "John",
+            "rating": 6.0,
+            "review_text": "Decent",
+            "status": "watched"
+        })
+        review_id = review_response.json()["id"]
+
+        response = await client.patch(f"/api/reviews/{review_id}", json={"rating": 7.5})
+        assert response.status_code == 200
+        data = response.json()
+        assert data["rating"] == 7.5
+        assert data["review_text"] == "Decent"
+        assert data["status"] == "watched"
+
+
+@pytest.mark.asyncio
+async def test_write_released_after_error():
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        response = await client.patch("/api/reviews/999", json={"rating": 5.0})
+        assert response.status_code == 404
+        assert not pool.writer.in_transaction
+
+        response = await client.post("/api/anime", json={"title": "Naruto"})
+        assert response.status_code == 200
+
+
+class StubReader:
+    def __init__(self, rows, done):
+        self.rows = rows
+        self.done = done
+
+    async def execute_fetchall(self, sql, parameters=()):
+        await self.done.wait()
+        return self.rows
+
+
+@pytest.mark.asyncio
+async def test_stats_overlapping_refreshes(monkeypatch):
+    old_done, new_done = asyncio.Event(), asyncio.Event()
+    old_rows = [{"title": "Naruto", "average_rating": 6.0, "review_count": 1}]
+    new_rows = [{"title": "Naruto", "average_rating": 8.0, "review_count": 2}]
+    readers = iter([StubReader(old_rows, old_done), StubReader(new_rows, new_done)])
+
+    @asynccontextmanager
+    async def read(self):
+        yield next(readers)
+
+    monkeypatch.setattr(DBPool, "read", read)
+
+    # The first refresh reads old data, a write lands, then a second refresh
+    # reads new data and finishes before the first one does.
+    first = asyncio.create_task(get_stats())
+    await asyncio.sleep(0)
+    invalidate_stats()
+    second = asyncio.create_task(get_stats())
+    await asyncio.sleep(0)
+    new_done.set()
+    assert await second == new_rows
+    old_done.set()
+    assert await first == old_rows
+
+    monkeypatch.undo()
+    assert await get_stats() == new_rows
+
+
+@pytest.mark.asyncio
+async def test_update_review_cannot_rate_planning():
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        anime_response = await client.post("/api/anime", json={
+            "title": "Naruto"
+        })
+        review_response = await client.post("/api/reviews", json={
+            "anime_id": anime_response.json()["id"],
+            "user_name": "John",
+            "rating": 6.0,
+            "status": "watched"
+        })
+        review_id = review_response.json()["id"]
+
+        for body in [{"status": "planning"}, {"status": "planning", "rating": 5.0}]:
+            response = await client.patch(f"/api/reviews/{review_id}", json=body)
+            assert response.status_code == 400